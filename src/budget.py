@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from collections import OrderedDict, deque
+from typing import Callable, List, Tuple
+
+__all__ = [
+    "TokenCounter",
+    "EarlyStop",
+    "fit_history",
+]
+
+# Short repeats ("0, 0, 0", "|---|---", a few identical matrix rows) are
+# normal in code and tables, so a loop has to cover at least this many tokens.
+_MIN_LOOP_TOKENS = 256
+
+
+class TokenCounter:
+    """Token counts of chat messages, cached per (model, role, text)."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._cache: OrderedDict[tuple, int] = OrderedDict()
+
+    def count(self, llm, model_path: str, role: str, text: str) -> int:
+        key = (model_path, role, text)
+        n = self._cache.get(key)
+        if n is None:
+            n = len(llm.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+            self._cache[key] = n
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return n
+
+
+def fit_history(
+    count: Callable[[str, str], int],
+    system_message: str,
+    history: List[Tuple[str, str]],
+    message: str,
+    limit: int,
+) -> Tuple[List[Tuple[str, str]], int, int]:
+    """
+    Drop the oldest turns until the prompt fits into *limit* tokens.
+
+    *count* maps ``(role, text)`` to a token count including role markers.
+    Returns the kept history, the prompt size and the number of dropped turns.
+    """
+    turns = [count("user", u) + count("assistant", a) for u, a in history]
+    fixed = 1 + count("system", system_message) + count("user", message) + count("assistant", "")
+    total = fixed + sum(turns)
+    dropped = 0
+    while dropped < len(turns) and total > limit:
+        total -= turns[dropped]
+        dropped += 1
+    return list(history[dropped:]), total, dropped
+
+
+class EarlyStop:
+    """
+    Early-stop policies applied to a token stream.
+
+    ``feed()`` returns the reason to stop, or ``None`` to keep going:
+
+    * ``"time_limit"`` – decoding took longer than *max_seconds*
+    * ``"idle"``       – *idle_tokens* whitespace-only tokens in a row
+    * ``"loop"``       – the tail repeats a block of up to *loop_period*
+      tokens *loop_repeats* times, and for at least 256 tokens
+    """
+
+    def __init__(
+        self,
+        max_seconds: float | None = None,
+        loop_period: int = 64,
+        loop_repeats: int = 4,
+        idle_tokens: int = 32,
+    ):
+        self.max_seconds = max_seconds
+        self.loop_period = loop_period
+        self.loop_repeats = loop_repeats
+        self.idle_tokens = idle_tokens
+        self._idle_run = 0
+        self._recent: deque[str] = deque(
+            maxlen=max(loop_period * loop_repeats, _MIN_LOOP_TOKENS)
+        )
+
+    def feed(self, token: str, elapsed: float) -> str | None:
+        if self.max_seconds and elapsed > self.max_seconds:
+            return "time_limit"
+
+        self._idle_run = self._idle_run + 1 if not token.strip() else 0
+        if self.idle_tokens and self._idle_run >= self.idle_tokens:
+            return "idle"
+
+        self._recent.append(token)
+        if self.loop_period and self._looping():
+            return "loop"
+        return None
+
+    def _looping(self) -> bool:
+        seq = self._recent
+        n = len(seq)
+        last = seq[-1]
+        for period in range(1, min(self.loop_period, n // 2) + 1):
+            if seq[-1 - period] != last:
+                continue
+            span = max(period * self.loop_repeats, _MIN_LOOP_TOKENS)
+            if span > n:
+                continue
+            if not _periodic(list(seq)[-span:], period):
+                continue
+            return True
+        return False
+
+
+def _periodic(seq: List[str], period: int) -> bool:
+    return all(seq[i] == seq[i + period] for i in range(len(seq) - period))
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import List
+
+__all__ = [
+    "ModelCatalog",
+    "get_catalog",
+    "read_gguf_metadata",
+    "detect_chat_format",
+    "template_markers",
+    "load_params",
+]
+
+# ───────────────────────────── GGUF header ──────────────────────────────────
+_GGUF_MAGIC = b"GGUF"
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_SCALARS = {
+    0: struct.Struct("<B"),
+    1: struct.Struct("<b"),
+    2: struct.Struct("<H"),
+    3: struct.Struct("<h"),
+    4: struct.Struct("<I"),
+    5: struct.Struct("<i"),
+    6: struct.Struct("<f"),
+    7: struct.Struct("<?"),
+    10: struct.Struct("<Q"),
+    11: struct.Struct("<q"),
+    12: struct.Struct("<d"),
+}
+_STRING = 8
+_ARRAY = 9
+
+# Bump when the fields or the detection rules change, to re-read cached headers
+_ENTRY_VERSION = 3
+
+# llama_ftype values stored in ``general.file_type``
+_FILE_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1",
+    10: "Q2_K", 11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S",
+    15: "Q4_K_M", 16: "Q5_K_S", 17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS",
+    20: "IQ2_XS", 21: "Q2_K_S", 22: "IQ3_XS", 23: "IQ3_XXS", 24: "IQ1_S",
+    25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M", 28: "IQ2_S", 29: "IQ2_M",
+    30: "IQ4_XS", 31: "IQ1_M", 32: "BF16", 36: "TQ1_0", 37: "TQ2_0",
+}
+
+
+def _wanted(key: str) -> bool:
+    return (
+        key in (
+            "general.architecture",
+            "general.name",
+            "general.file_type",
+            "tokenizer.chat_template",
+            "tokenizer.ggml.pre",
+        )
+        or key.endswith(".context_length")
+    )
+
+
+def _read_str(mm: mmap.mmap, pos: int) -> tuple[str, int]:
+    (n,) = _U64.unpack_from(mm, pos)
+    pos += 8
+    return mm[pos:pos + n].decode("utf-8", errors="replace"), pos + n
+
+
+def _skip_value(mm: mmap.mmap, pos: int, vtype: int) -> int:
+    if vtype in _SCALARS:
+        return pos + _SCALARS[vtype].size
+    if vtype == _STRING:
+        return pos + 8 + _U64.unpack_from(mm, pos)[0]
+    if vtype == _ARRAY:
+        (itype,) = _U32.unpack_from(mm, pos)
+        (n,) = _U64.unpack_from(mm, pos + 4)
+        pos += 12
+        if itype in _SCALARS:
+            return pos + n * _SCALARS[itype].size
+        for _ in range(n):  # strings / nested arrays have to be walked
+            pos = _skip_value(mm, pos, itype)
+        return pos
+    raise ValueError(f"Unknown GGUF value type: {vtype}")
+
+
+def read_gguf_metadata(path: str) -> dict:
+    """
+    Read the metadata needed by the catalog from a GGUF header.
+
+    The file is memory-mapped and only the header pages are touched: large
+    arrays (the tokenizer vocabulary) are skipped by offset, tensor data is
+    never read.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:4] != _GGUF_MAGIC:
+            raise ValueError(f"Not a GGUF file: {path}")
+        (version,) = _U32.unpack_from(mm, 4)
+        if version < 2:
+            raise ValueError(f"Unsupported GGUF version {version}: {path}")
+        (n_kv,) = _U64.unpack_from(mm, 16)
+
+        meta: dict = {}
+        pos = 24
+        for _ in range(n_kv):
+            key, pos = _read_str(mm, pos)
+            (vtype,) = _U32.unpack_from(mm, pos)
+            pos += 4
+            if not _wanted(key) or vtype == _ARRAY:
+                pos = _skip_value(mm, pos, vtype)
+            elif vtype == _STRING:
+                meta[key], pos = _read_str(mm, pos)
+            else:
+                (meta[key],) = _SCALARS[vtype].unpack_from(mm, pos)
+                pos += _SCALARS[vtype].size
+        return meta
+
+
+# ───────────────────────────── Detection ────────────────────────────────────
+def detect_chat_format(
+    architecture: str | None,
+    chat_template: str | None,
+    name: str | None = None,
+    tokenizer_pre: str | None = None,
+) -> str | None:
+    """Map a model to one of the formatter keys known to ``llm_utils``."""
+    template = chat_template or ""
+    if "<start_of_turn>" in template:
+        return "gemma-3"
+    if "<|start_header_id|>" in template:
+        return "llama-3"
+    if "<|im_start|>" in template:
+        return "chatml"
+    if "<|user|>" in template and "<|end|>" in template:
+        return "phi-3"
+    if "<<SYS>>" in template:
+        return "llama-2"
+    if "[INST]" in template:
+        return "mistral"
+
+    arch = (architecture or "").lower()
+    if arch.startswith("gemma"):
+        return "gemma-3"
+    if arch.startswith(("qwen", "internlm", "olmo")):
+        return "chatml"
+    if arch.startswith("phi3"):
+        return "phi-3"
+    if arch.startswith("mistral"):
+        return "mistral"
+    if arch == "llama":
+        # Llama 2, Mistral v0.1, TinyLlama, Vicuna, ... share this architecture;
+        # only the Llama 3 tokenizer or name identifies a Llama 3 model.
+        label = (name or "").lower().replace("-", " ")
+        if tokenizer_pre == "llama-bpe" or "llama 3" in label or "llama3" in label:
+            return "llama-3"
+        if not template:
+            return "llama-2"
+    return None
+
+
+# Placeholder message contents, located in the rendered template
+_SYSTEM, _USER_1, _ASSISTANT, _USER_2 = "QQSYSTEMQQ", "QQUSER1QQ", "QQASSISTANTQQ", "QQUSER2QQ"
+
+
+def template_markers(chat_template: str, eos_token: str = "") -> dict | None:
+    """
+    Derive per-role prompt markers from a model's Jinja chat template.
+
+    The template is rendered for a short placeholder conversation and the
+    text around each message is taken as that role's start and end marker.
+    Returns ``{"system": (start, end), "user": ..., "assistant": ...,
+    "system_in_user": bool, "stop": [...]}``, or ``None`` if the template
+    can't be rendered or doesn't fit the start/end marker model.
+    """
+    try:
+        from jinja2 import TemplateError
+        from jinja2.sandbox import ImmutableSandboxedEnvironment
+    except ImportError:
+        return None
+
+    def raise_exception(message):
+        raise TemplateError(message)
+
+    env = ImmutableSandboxedEnvironment(trim_blocks=True, lstrip_blocks=True)
+    env.globals["raise_exception"] = raise_exception
+
+    def render(messages, add_generation_prompt=False) -> str:
+        return compiled.render(
+            messages=[{"role": r, "content": c} for r, c in messages],
+            add_generation_prompt=add_generation_prompt,
+            bos_token="",
+            eos_token=eos_token,
+        )
+
+    chat = [("user", _USER_1), ("assistant", _ASSISTANT), ("user", _USER_2)]
+    try:
+        compiled = env.from_string(chat_template)
+        text = render(chat)
+        prompt = render(chat, add_generation_prompt=True)
+    except Exception:  # templates are arbitrary code; any failure means "unusable"
+        return None
+    if not prompt.startswith(text) or any(m not in text for m in (_USER_1, _ASSISTANT, _USER_2)):
+        return None
+
+    # <user_start>U1<user_end><assistant_start>A<assistant_end><user_start>U2<user_end>
+    user_start, rest = text.split(_USER_1, 1)
+    user_assistant, rest = rest.split(_ASSISTANT, 1)
+    assistant_user, user_end = rest.split(_USER_2, 1)
+    assistant_start = prompt[len(text):]
+    if (
+        not assistant_start
+        or not user_assistant.startswith(user_end + assistant_start)
+        or user_assistant[len(user_end + assistant_start):].strip()
+        or not assistant_user.endswith(user_start)
+    ):
+        return None
+    assistant_end = assistant_user[: len(assistant_user) - len(user_start)]
+
+    # System prompt: its own block before the first user turn, or merged into it
+    system, system_in_user = ("", "\n\n"), True
+    try:
+        text = render([("system", _SYSTEM), ("user", _USER_1)])
+    except Exception:
+        text = ""
+    if _SYSTEM in text and _USER_1 in text:
+        system_start, rest = text.split(_SYSTEM, 1)
+        between = rest.split(_USER_1, 1)[0]
+        if between.endswith(user_start):
+            system = (system_start, between[: len(between) - len(user_start)])
+            system_in_user = False
+        elif system_start.startswith(user_start):
+            system = (system_start[len(user_start):], between)
+
+    stop = [m.strip() for m in (assistant_end, user_start, eos_token) if m.strip()]
+    return {
+        "system": system,
+        "user": (user_start, user_end),
+        "assistant": (assistant_start, assistant_end),
+        "system_in_user": system_in_user,
+        "stop": list(dict.fromkeys(stop)),
+    }
+
+
+def load_params(info: dict, max_ctx: int = 102_400) -> dict:
+    """Default ``Llama`` arguments for a catalog entry."""
+    ctx = info.get("context_length") or max_ctx
+    return {"n_ctx": min(ctx, max_ctx)}
+
+
+# ───────────────────────────── Catalog ──────────────────────────────────────
+class ModelCatalog:
+    """
+    GGUF models in *models_dir* with their header metadata.
+
+    Parsed headers are cached in *cache_path*, keyed by file path and
+    validated by size and mtime, so only new or changed files are read.
+    """
+
+    def __init__(self, models_dir: str = "models", cache_path: str = "model_catalog.json"):
+        self.models_dir = Path(models_dir)
+        self.cache_path = Path(cache_path)
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        if self.cache_path.exists():
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def info(self, path: str) -> dict:
+        """Catalog entry for *path*, parsing the header only if it changed."""
+        with self._lock:
+            entry, changed = self._lookup(path)
+            if changed:
+                self._save()
+            return entry
+
+    def scan(self, parse: bool = True) -> List[dict]:
+        """
+        Entries for every ``.gguf`` file in ``models_dir``, sorted by name.
+
+        With ``parse=False`` only cached headers are used; new or changed
+        files get a placeholder entry with ``"pending": True`` that
+        ``info()`` can fill in later.
+        """
+        entries = []
+        changed = False
+        with self._lock:
+            if self.models_dir.is_dir():
+                for path in sorted(self.models_dir.glob("*.gguf")):
+                    entry, updated = self._lookup(str(path), parse)
+                    entries.append(entry)
+                    changed |= updated
+            if changed:
+                self._save()
+        return entries
+
+    def _lookup(self, path: str, parse: bool = True) -> tuple[dict, bool]:
+        key = os.path.abspath(path)
+        st = os.stat(key)
+        entry = self._entries.get(key)
+        if (
+            entry
+            and entry.get("version") == _ENTRY_VERSION
+            and entry["size"] == st.st_size
+            and entry["mtime_ns"] == st.st_mtime_ns
+        ):
+            return entry, False
+
+        entry = {
+            "version": _ENTRY_VERSION,
+            "path": key,
+            "name": Path(key).stem,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "architecture": None,
+            "context_length": None,
+            "chat_template": None,
+            "tokenizer_pre": None,
+            "quantization": None,
+            "chat_format": None,
+            "error": None,
+        }
+        if not parse:
+            entry["pending"] = True
+            return entry, False
+        try:
+            meta = read_gguf_metadata(key)
+        except (OSError, ValueError, struct.error) as ex:
+            entry["error"] = str(ex)
+        else:
+            arch = meta.get("general.architecture")
+            entry["name"] = meta.get("general.name") or entry["name"]
+            entry["architecture"] = arch
+            entry["context_length"] = meta.get(f"{arch}.context_length")
+            entry["chat_template"] = meta.get("tokenizer.chat_template")
+            entry["tokenizer_pre"] = meta.get("tokenizer.ggml.pre")
+            file_type = meta.get("general.file_type")
+            entry["quantization"] = _FILE_TYPES.get(file_type, file_type)
+            entry["chat_format"] = detect_chat_format(
+                arch, entry["chat_template"], entry["name"], entry["tokenizer_pre"]
+            )
+        self._entries[key] = entry
+        return entry, True
+
+    def _save(self):
+        tmp = self.cache_path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass  # the cache is only an optimisation
+
+
+_catalog: ModelCatalog | None = None
+
+
+def get_catalog() -> ModelCatalog:
+    """Return the shared catalog, created on first use."""
+    global _catalog
+    if _catalog is None:
+        _catalog = ModelCatalog()
+    return _catalog
@@ -5,17 +5,88 @@ import os
 import queue
 import re
 import threading
-from typing import List, Tuple
+from typing import List
 import webbrowser
 from config import load_settings, save_settings
 import tkinter as tk
 import tkinter.font as tkfont
 from tkinter import filedialog, messagebox, simpledialog, ttk  # noqa: F401 – same imports kept
 
-from llm_utils import respond  # ← the only new import compared with original
+from catalog import get_catalog
+from memory import MemoryIndex
+from scheduler import GenerationScheduler
 
-__all__ = ["ChatGUI", "run_app"]
+__all__ = ["ChatGUI", "ChatTab", "run_app"]
 
+# Why a generation ended, as reported by respond() / the scheduler
+_END_REASONS = {
+    "eos": "end of answer",
+    "max_tokens": "token limit",
+    "context_full": "context full",
+    "time_limit": "time limit",
+    "loop": "repetition detected",
+    "idle": "idle tokens",
+    "cancelled": "stopped",
+    "error": "error",
+}
+
+
+class ChatTab:
+    """Widgets and per-session state of one chat tab."""
+
+    def __init__(self, notebook: ttk.Notebook, session):
+        self.session = session
+        self.frame = tk.Frame(notebook, bg="white")
+
+        panes = ttk.PanedWindow(self.frame, orient="vertical", style="Plain.TPanedwindow")
+        panes.pack(fill=tk.BOTH, expand=True)
+
+        # History
+        hist_frame = tk.Frame(self.frame, bg="white")
+        self.history_text = tk.Text(
+            hist_frame,
+            wrap=tk.WORD,
+            state="disabled",
+            bg="white",
+            bd=0,
+            highlightthickness=0,
+            font=("Arial", 10),
+        )
+        self.history_text.tag_config("find_highlight", background="yellow")
+        vscroll_hist = tk.Scrollbar(hist_frame, command=self.history_text.yview)
+        self.history_text.configure(yscrollcommand=vscroll_hist.set)
+        vscroll_hist.pack(side=tk.RIGHT, fill=tk.Y)
+        self.history_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        panes.add(hist_frame, weight=4)
+
+        # Input
+        inp_frame = tk.Frame(self.frame, bg="white")
+        self.input_text = tk.Text(
+            inp_frame,
+            height=4,
+            wrap=tk.WORD,
+            bg="white",
+            bd=0,
+            highlightthickness=0,
+            font=("Arial", 10),
+        )
+        vscroll_inp = tk.Scrollbar(inp_frame, command=self.input_text.yview)
+        self.input_text.configure(yscrollcommand=vscroll_inp.set)
+        vscroll_inp.pack(side=tk.RIGHT, fill=tk.Y)
+        self.input_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        panes.add(inp_frame, weight=1)
+
+        # Per-tab throughput / wait time
+        self.status = tk.Label(self.frame, anchor="w", bg="white", fg="grey", font=("Arial", 8))
+        self.status.pack(fill=tk.X, side=tk.BOTTOM)
+
+        self.history_data: List[dict] = []
+        self.assistant_segments: list[tuple[str, str]] = []
+        self.queue: queue.Queue[str | None] = queue.Queue()
+        self.assist_start = "1.0"
+        self.search_start = "1.0"
+        # True from on_send until _process_queue has drained the end marker
+        self.streaming = False
 
 
 class ChatGUI:
@@ -44,6 +115,10 @@ class ChatGUI:
         model_menu = tk.Menu(menubar, tearoff=0)
         model_menu.add_command(label="Select Model", command=self.select_model)
         model_menu.add_command(label="Edit System Prompt", accelerator=f"{self.settings["bindings"]['edit-system-prompt']}", command=self.edit_system_prompt)
+        model_menu.add_separator()
+        self.memory_var = tk.BooleanVar(value=self.settings["memory"]["enabled"])
+        model_menu.add_checkbutton(label="Use Chat Memory", variable=self.memory_var, command=self.toggle_memory)
+        model_menu.add_command(label="Index Saved Chats", command=self.index_memory)
         menubar.add_cascade(label="Model", menu=model_menu)
 
         edit_menu = tk.Menu(menubar, tearoff=0)
@@ -54,6 +129,15 @@ class ChatGUI:
         edit_menu.add_command(label="Clear", accelerator=f"{self.settings["bindings"]['clear']}", command=self.on_clear)
         menubar.add_cascade(label="Edit", menu=edit_menu)
 
+        session_menu = tk.Menu(menubar, tearoff=0)
+        session_menu.add_command(label="New Tab", accelerator=f"{self.settings["bindings"]['new-tab']}", command=self.new_tab)
+        session_menu.add_command(label="Close Tab", accelerator=f"{self.settings["bindings"]['close-tab']}", command=self.close_tab)
+        session_menu.add_separator()
+        self.priority_var = tk.IntVar(value=0)
+        for label, value in (("High Priority", 1), ("Normal Priority", 0), ("Low Priority", -1)):
+            session_menu.add_radiobutton(label=label, variable=self.priority_var, value=value, command=self.set_priority)
+        menubar.add_cascade(label="Session", menu=session_menu)
+
         view_menu = tk.Menu(menubar, tearoff=0)
         view_menu.add_command(label="Zoom In", accelerator="Control +", command=self.zoom_in)
         view_menu.add_command(label="Zoom Out", accelerator="Control -", command=self.zoom_out)
@@ -74,64 +158,25 @@ class ChatGUI:
             relief="flat",
             sashwidth=4,
         )
-        panes = ttk.PanedWindow(root, orient="vertical", style="Plain.TPanedwindow")
-        panes.pack(fill=tk.BOTH, expand=True)
-
-        # History
-        hist_frame = tk.Frame(root, bg="white")
-        self.history_text = tk.Text(
-            hist_frame,
-            wrap=tk.WORD,
-            state="disabled",
-            bg="white",
-            bd=0,
-            highlightthickness=0,
-            font=("Arial", 10),
-        )
-
-        self.assistant_segments: list[tuple[str, str]] = []
+        self.notebook = ttk.Notebook(root)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook.bind("<<NotebookTabChanged>>", lambda e: self._on_tab_changed())
 
-        self.bold_font = tkfont.Font(self.history_text, self.history_text.cget("font"))
+        self.bold_font = tkfont.Font(root, font=("Arial", 10))
         self.bold_font.configure(weight="bold")
         self.style_on = True
-        self._apply_word_style()
-
-        self.history_text.tag_config("find_highlight", background="yellow")
-        self.history_text.tag_config("user_word", font=self.bold_font, underline=True)
-        vscroll_hist = tk.Scrollbar(hist_frame, command=self.history_text.yview)
-        self.history_text.configure(yscrollcommand=vscroll_hist.set)
-        vscroll_hist.pack(side=tk.RIGHT, fill=tk.Y)
-        self.history_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        panes.add(hist_frame, weight=4)
-
-        # Input
-        inp_frame = tk.Frame(root, bg="white")
-        self.input_text = tk.Text(
-            inp_frame,
-            height=4,
-            wrap=tk.WORD,
-            bg="white",
-            bd=0,
-            highlightthickness=0,
-            font=("Arial", 10),
-        )
-        self.input_text.focus_set()
-        vscroll_inp = tk.Scrollbar(inp_frame, command=self.input_text.yview)
-        self.input_text.configure(yscrollcommand=vscroll_inp.set)
-        vscroll_inp.pack(side=tk.RIGHT, fill=tk.Y)
-        self.input_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        panes.add(inp_frame, weight=1)
 
         # ─────────────────── Internals ───────────────────
-        self.queue: queue.Queue[str | None] = queue.Queue()
-        self.gen_thread: threading.Thread | None = None
-        self.stop_event = threading.Event()
-        self.history_data: List[dict] = []
+        sched = self.settings["scheduler"]
+        self.scheduler = GenerationScheduler(policy=sched["policy"], quantum=sched["quantum"])
+        self.tabs: dict[str, ChatTab] = {}
+        self.memory: MemoryIndex | None = None  # opened when memory is enabled
+        self.index_thread: threading.Thread | None = None
+        self._tab_counter = 0
         self._table_pattern = re.compile(
             r"(\|[^\n]+\|\n\|[ \-:|]+\|\n(?:\|[^\n]+\|\n?)*)",
             re.MULTILINE,
         )
-        self.search_start = "1.0"
 
         # Window for user prompts (created on first ctrl-click)
         self.user_prompts_win: tk.Toplevel | None = None
@@ -146,20 +191,71 @@ class ChatGUI:
         root.bind(f"<{self.settings["bindings"]['edit-system-prompt']}>", lambda e: self.edit_system_prompt())
         root.bind(f"<{self.settings["bindings"]['stop-generation']}>", lambda e: self.on_stop())
         root.bind(f"<{self.settings["bindings"]['clear']}>", lambda e: self.on_clear())
+        root.bind(f"<{self.settings["bindings"]['new-tab']}>", lambda e: self.new_tab())
+        root.bind(f"<{self.settings["bindings"]['close-tab']}>", lambda e: self.close_tab())
         root.bind("<Control-MouseWheel>", self._on_ctrl_mousewheel)
 
+        self.new_tab()
+        if self.memory_var.get():
+            self._open_memory()
+
+    # ─────────────────── Tabs ───────────────────
+    @property
+    def tab(self) -> ChatTab:
+        """The tab currently shown in the notebook."""
+        return self.tabs[self.notebook.select()]
+
+    def new_tab(self):
+        self._tab_counter += 1
+        title = f"Chat {self._tab_counter}"
+        tab = ChatTab(self.notebook, self.scheduler.open_session(title))
+        self.tabs[str(tab.frame)] = tab
+        self._apply_word_style(tab)
+        self.notebook.add(tab.frame, text=title)
+        self.notebook.select(tab.frame)
+        tab.input_text.focus_set()
+
+    def close_tab(self):
+        if len(self.tabs) == 1:
+            self.on_clear()
+            return
+        tab = self.tab
+        if tab.streaming and not messagebox.askyesno(
+            "Close Tab", "Generation in progress.\nStop it and close the tab?"
+        ):
+            return
+        self.scheduler.close_session(tab.session)
+        del self.tabs[str(tab.frame)]
+        self.notebook.forget(tab.frame)
+        tab.frame.destroy()
+
+    def set_priority(self):
+        self.tab.session.priority = self.priority_var.get()
+
+    def _on_tab_changed(self):
+        if self.notebook.select() not in self.tabs:
+            return
+        tab = self.tab
+        self.priority_var.set(tab.session.priority)
+        tab.input_text.focus_set()
+
 
     def exit_root(self):
+        self.scheduler.shutdown()
         save_settings(self.settings, self.model_path, self.system_prompt)
         self.root.quit()
 
     def save_chat(self):
-        if not self.history_data:
+        tab = self.tab
+        if not tab.history_data:
             messagebox.showinfo("Save Chat", "Nothing to save yet.")
             return
 
+        chats_dir = self.settings["memory"]["chats_dir"]
+        os.makedirs(chats_dir, exist_ok=True)
         path = filedialog.asksaveasfilename(
             title="Save Chat",
+            initialdir=chats_dir,
             defaultextension=".json",
             filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
         )
@@ -168,13 +264,17 @@ class ChatGUI:
 
         try:
             with open(path, "w", encoding="utf-8") as f:
-                json.dump(self.history_data, f, ensure_ascii=False, indent=2)
+                json.dump(tab.history_data, f, ensure_ascii=False, indent=2)
             messagebox.showinfo("Save Chat", f"Chat saved to:\n{path}")
         except Exception as ex:
             messagebox.showerror("Save Chat", f"Failed to save:\n{ex}")
+            return
+        if self.memory_var.get():
+            self.index_memory(quiet=True)
 
     def load_chat(self):
-        if self.gen_thread and self.gen_thread.is_alive():
+        tab = self.tab
+        if tab.streaming:
             messagebox.showinfo("Please wait", "Cannot load while generating.")
             return
 
@@ -199,26 +299,95 @@ class ChatGUI:
         # wipe current session
         self.on_clear()
 
-        self.history_data = data
-        self.history_text.config(state="normal")
+        tab.history_data = data
+        tab.history_text.config(state="normal")
 
-        for entry in self.history_data:
+        for entry in tab.history_data:
             user_msg, assist_msg = entry["user"], entry["assistant"]
             # User line
-            self.history_text.insert(tk.END, f"User: {user_msg}\nAssistant: ")
-            assist_start = self.history_text.index("end-1c")
+            tab.history_text.insert(tk.END, f"User: {user_msg}\nAssistant: ")
+            assist_start = tab.history_text.index("end-1c")
             # Assistant line
-            self.history_text.insert(tk.END, assist_msg)
-            assist_end = self.history_text.index("end-1c")
-            self.assistant_segments.append((assist_start, assist_end))
-            self.history_text.insert(tk.END, "\n\n")
+            tab.history_text.insert(tk.END, assist_msg)
+            assist_end = tab.history_text.index("end-1c")
+            tab.assistant_segments.append((assist_start, assist_end))
+            tab.history_text.insert(tk.END, "\n\n")
             # apply post-processing (tables, link stripping, highlights, …)
-            self._post_process(assist_start, assist_end)
+            self._post_process(tab, assist_start, assist_end)
+
+        tab.history_text.config(state="disabled")
+        tab.history_text.see(tk.END)
+        messagebox.showinfo("Load Chat", f"Loaded {len(tab.history_data)} turns.")
+
+
+    # ─────────────────── Chat memory ───────────────────
+    def _open_memory(self) -> bool:
+        """Load the memory index; on failure memory is switched off."""
+        if self.memory is not None:
+            return True
+        mem = self.settings["memory"]
+        try:
+            self.memory = MemoryIndex(
+                mem["model"],
+                index_dir=mem["index_dir"],
+                dtype=mem["dtype"],
+                batch_size=mem["batch_size"],
+                min_score=mem["min_score"],
+                document_prefix=mem["document_prefix"],
+                query_prefix=mem["query_prefix"],
+            )
+        except Exception as ex:
+            messagebox.showerror("Chat Memory", f"Could not load the memory index:\n{ex}")
+            self.memory_var.set(False)
+            mem["enabled"] = False
+            return False
+        return True
+
+    def toggle_memory(self):
+        enabled = self.memory_var.get()
+        model_path = self.settings["memory"]["model"]
+        if enabled and not os.path.exists(model_path):
+            messagebox.showerror(
+                "Chat Memory", f"Embedding model not found:\n{model_path}"
+            )
+            self.memory_var.set(False)
+            return
+        if enabled and not self._open_memory():
+            return
+        self.settings["memory"]["enabled"] = enabled
+        if enabled:
+            self.index_memory(quiet=True)
 
-        self.history_text.config(state="disabled")
-        self.history_text.see(tk.END)
-        messagebox.showinfo("Load Chat", f"Loaded {len(self.history_data)} turns.")
+    def index_memory(self, quiet: bool = False):
+        """Embed new saved chats in a background thread."""
+        if not self._open_memory():
+            return
+        if self.index_thread and self.index_thread.is_alive():
+            if not quiet:
+                messagebox.showinfo("Chat Memory", "Indexing is already running.")
+            return
+        result: dict = {}
 
+        def work():
+            try:
+                result["added"] = self.memory.update(self.settings["memory"]["chats_dir"])
+            except Exception as ex:
+                result["error"] = ex
+
+        def poll():
+            if self.index_thread.is_alive():
+                self.root.after(200, poll)
+            elif "error" in result:
+                messagebox.showerror("Chat Memory", f"Indexing failed:\n{result['error']}")
+            elif not quiet:
+                messagebox.showinfo(
+                    "Chat Memory",
+                    f"Added {result['added']} chunks ({self.memory.count} in total).",
+                )
+
+        self.index_thread = threading.Thread(target=work, daemon=True)
+        self.index_thread.start()
+        self.root.after(200, poll)
 
     # ─────────────────── System Prompt Editor ───────────────────
     def edit_system_prompt(self):
@@ -275,26 +444,28 @@ class ChatGUI:
         self.find_window.geometry(f"+{x}+{y}")
 
         self.find_entry.focus_set()
-        self.search_start = "1.0"
+        self.tab.search_start = "1.0"
 
     def find_next(self):
         pattern = self.find_entry.get()
         if not pattern:
             return
-        idx = self.history_text.search(pattern, self.search_start, tk.END, nocase=True)
+        tab = self.tab
+        idx = tab.history_text.search(pattern, tab.search_start, tk.END, nocase=True)
         if not idx:
             messagebox.showinfo("Find", f"'{pattern}' not found")
-            self.search_start = "1.0"
+            tab.search_start = "1.0"
             return
         end_idx = f"{idx}+{len(pattern)}c"
-        self.history_text.tag_remove("find_highlight", "1.0", tk.END)
-        self.history_text.tag_add("find_highlight", idx, end_idx)
-        self.history_text.see(idx)
-        self.search_start = end_idx
+        tab.history_text.tag_remove("find_highlight", "1.0", tk.END)
+        tab.history_text.tag_add("find_highlight", idx, end_idx)
+        tab.history_text.see(idx)
+        tab.search_start = end_idx
 
     def _close_find(self):
         """Remove highlight and destroy the Find window."""
-        self.history_text.tag_remove("find_highlight", "1.0", tk.END)
+        for tab in self.tabs.values():
+            tab.history_text.tag_remove("find_highlight", "1.0", tk.END)
         if hasattr(self, "find_window") and self.find_window.winfo_exists():
             self.find_window.destroy()
 
@@ -303,24 +474,118 @@ class ChatGUI:
         self.zoom_in() if event.delta > 0 else self.zoom_out()
 
     def select_model(self):
-        path = filedialog.askopenfilename(
-            title="Select Model",
-            initialdir="models",
-            filetypes=[("GGUF Model", "*.gguf"), ("All files", "*.*")],
-        )
-        if path:
-            self.model_path = path
-            messagebox.showinfo("Model Selected", f"Model set to:\n{path}")
+        if self.scheduler.is_busy() or any(t.streaming for t in self.tabs.values()):
+            messagebox.showinfo("Please wait", "Cannot change model while generating.")
+            return
+
+        def choose(path: str):
+            win.destroy()
+            self._set_model(path)
+
+        def choose_selected():
+            selected = tree.selection()
+            if selected:
+                choose(selected[0])
+
+        def browse():
+            path = filedialog.askopenfilename(
+                parent=win,
+                title="Select Model",
+                initialdir="models",
+                filetypes=[("GGUF Model", "*.gguf"), ("All files", "*.*")],
+            )
+            if path:
+                choose(path)
+
+        win = tk.Toplevel(self.root)
+        win.title("Select Model")
+        win.transient(self.root)
+        win.grab_set()
+
+        def row_values(entry: dict) -> tuple:
+            unknown = "…" if entry.get("pending") else "?"
+            return (
+                entry["architecture"] or unknown,
+                entry["quantization"] or unknown,
+                entry["context_length"] or unknown,
+                f"{entry['size'] / 2**30:.1f} GB",
+            )
+
+        def parse_pending(paths: list[str]):
+            for path in paths:
+                try:
+                    parsed.put(get_catalog().info(path))
+                except OSError:
+                    pass
+            parsed.put(None)
+
+        def poll_parsed():
+            if not win.winfo_exists():
+                return
+            while True:
+                try:
+                    entry = parsed.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    return
+                if tree.exists(entry["path"]):
+                    tree.item(entry["path"], text=entry["name"], values=row_values(entry))
+            win.after(100, poll_parsed)
+
+        # Fill the list from cached headers; new or changed files are parsed
+        # in the background so the dialog opens at once
+        columns = ("architecture", "quantization", "context", "size")
+        tree = ttk.Treeview(win, columns=columns, height=10)
+        tree.heading("#0", text="Model")
+        tree.column("#0", width=260)
+        for col in columns:
+            tree.heading(col, text=col.capitalize())
+            tree.column(col, width=100, anchor="center")
+        current = os.path.abspath(self.model_path)
+        entries = get_catalog().scan(parse=False)
+        for entry in entries:
+            tree.insert("", tk.END, iid=entry["path"], text=entry["name"], values=row_values(entry))
+            if entry["path"] == current:
+                tree.selection_set(entry["path"])
+        pending = [e["path"] for e in entries if e.get("pending")]
+        parsed: queue.Queue[dict | None] = queue.Queue()
+        if pending:
+            threading.Thread(target=parse_pending, args=(pending,), daemon=True).start()
+            win.after(100, poll_parsed)
+        tree.bind("<Double-1>", lambda e: choose_selected())
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        btn_frame = tk.Frame(win)
+        btn_frame.pack(pady=(0, 10))
+        tk.Button(btn_frame, text="Select", command=choose_selected).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Browse...", command=browse).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Cancel", command=win.destroy).pack(side=tk.LEFT, padx=5)
+
+        self._center_window(win)
+
+    def _set_model(self, path: str):
+        self.model_path = path
+        self.scheduler.forget_states()
+        info = get_catalog().info(path)
+        detail = ""
+        if info["architecture"]:
+            fmt = info["chat_format"] or ("from template" if info["chat_template"] else "plain")
+            detail = (
+                f"\n{info['architecture']} · {info['quantization']}"
+                f" · chat format: {fmt}"
+            )
+        messagebox.showinfo("Model Selected", f"Model set to:\n{path}{detail}")
 
     def zoom_in(self):
-        for w in (self.input_text, self.history_text):
+        for w in self._text_widgets():
             f = tkfont.Font(font=w.cget("font"))
             f.configure(size=f.cget("size") + 1)
             w.config(font=f)
         self._refresh_bold_font()
 
     def zoom_out(self):
-        for w in (self.input_text, self.history_text):
+        for w in self._text_widgets():
             f = tkfont.Font(font=w.cget("font"))
             s = f.cget("size")
             if s > 6:
@@ -328,6 +593,11 @@ class ChatGUI:
                 w.config(font=f)
         self._refresh_bold_font()
 
+    def _text_widgets(self):
+        for tab in self.tabs.values():
+            yield tab.input_text
+            yield tab.history_text
+
     def show_about(self):
         # Create a small About window
         win = tk.Toplevel(self.root)
@@ -393,110 +663,121 @@ class ChatGUI:
 
     # ─────────────────── Chat actions ───────────────────
     def on_send(self):
-        if self.gen_thread and self.gen_thread.is_alive():
+        tab = self.tab
+        if tab.streaming:
             messagebox.showinfo(
                 "Please wait", "Generation in progress.\nPress Ctrl+Z to stop first."
             )
             return
 
-        prompt = self.input_text.get("1.0", tk.END).strip()
+        prompt = tab.input_text.get("1.0", tk.END).strip()
         if not prompt:
             return
 
-        self.history_data.append({"user": prompt, "assistant": ""})
-        prev = [(d["user"], d["assistant"]) for d in self.history_data[:-1]]
-
-        self.history_text.config(state="normal")
-        self.history_text.insert(tk.END, f"User: {prompt}\nAssistant: ")
-        self.assist_start = self.history_text.index("end-1c")
-        self.history_text.config(state="disabled")
-
-        self.input_text.delete("1.0", tk.END)
-        self.history_text.see(tk.END)
-
-        self.queue = queue.Queue()
-        self.stop_event.clear()
-        self.gen_thread = threading.Thread(
-            target=self._worker_generate, args=(prompt, prev), daemon=True
+        tab.history_data.append({"user": prompt, "assistant": ""})
+        prev = [(d["user"], d["assistant"]) for d in tab.history_data[:-1]]
+
+        tab.history_text.config(state="normal")
+        tab.history_text.insert(tk.END, f"User: {prompt}\nAssistant: ")
+        tab.assist_start = tab.history_text.index("end-1c")
+        tab.history_text.config(state="disabled")
+
+        tab.input_text.delete("1.0", tk.END)
+        tab.history_text.see(tk.END)
+
+        tab.streaming = True
+        tab.queue = self.scheduler.submit(
+            tab.session,
+            prompt,
+            prev,
+            model=self.model_path,
+            system_message=self.system_prompt,
+            **self._respond_options(),
         )
-        self.gen_thread.start()
-        self.history_text.after(50, self._process_queue)
+        tab.history_text.after(50, self._process_queue, tab)
+
+    def _respond_options(self) -> dict:
+        options = dict(self.settings["generation"])
+        if self.memory_var.get() and self.memory is not None:
+            options["memory"] = self.memory
+            options["memory_top_k"] = self.settings["memory"]["top_k"]
+        return options
 
     def on_stop(self):
-        if self.gen_thread and self.gen_thread.is_alive():
-            self.stop_event.set()
+        self.scheduler.stop(self.tab.session)
 
     def on_clear(self):
-        if self.gen_thread and self.gen_thread.is_alive():
+        tab = self.tab
+        if tab.streaming:
             messagebox.showinfo("Please wait", "Cannot clear while generating.")
             return
-        self.history_data.clear()
-        self.history_text.config(state="normal")
-        self.history_text.delete("1.0", tk.END)
-        self.history_text.config(state="disabled")
-        self.input_text.delete("1.0", tk.END)
-        self.assistant_segments.clear()
-
-    # ─────────────────── Generation thread ───────────────────
-    def _worker_generate(self, prompt: str, history: List[Tuple[str, str]]):
-        last = ""
-        try:
-            for full in respond(
-                prompt,
-                history,
-                model=self.model_path,
-                system_message=self.system_prompt,
-            ):
-                if self.stop_event.is_set():
-                    break
-                delta = full[len(last) :]
-                self.queue.put(delta)
-                last = full
-        except Exception as e:
-            self.queue.put(f"[Error] {e}\n")
-        finally:
-            if self.history_data:
-                self.history_data[-1]["assistant"] = last
-            self.queue.put(None)
-
-    def _process_queue(self):
+        tab.history_data.clear()
+        tab.history_text.config(state="normal")
+        tab.history_text.delete("1.0", tk.END)
+        tab.history_text.config(state="disabled")
+        tab.input_text.delete("1.0", tk.END)
+        tab.assistant_segments.clear()
+
+    # ─────────────────── Generation output ───────────────────
+    def _process_queue(self, tab: ChatTab):
+        if not tab.frame.winfo_exists():
+            return
         while True:
             try:
-                item = self.queue.get_nowait()
+                item = tab.queue.get_nowait()
             except queue.Empty:
                 break
             if item is None:
-                self.history_text.config(state="normal")
-                self.history_text.insert(tk.END, "\n\n\n\n")
-                end_pos = self.history_text.index("end-1c")
-                self._post_process(self.assist_start, end_pos)
-                self.history_text.config(state="disabled")
+                tab.streaming = False
+                tab.history_text.config(state="normal")
+                tab.history_text.insert(tk.END, "\n\n\n\n")
+                end_pos = tab.history_text.index("end-1c")
+                self._post_process(tab, tab.assist_start, end_pos)
+                tab.history_text.config(state="disabled")
+                self._update_status(tab)
                 return
-            at_bot = float(self.history_text.yview()[1]) >= 0.99
-            self.history_text.config(state="normal")
-            self.history_text.insert(tk.END, item)
-            self.history_text.config(state="disabled")
+            if tab.history_data:
+                tab.history_data[-1]["assistant"] += item
+            at_bot = float(tab.history_text.yview()[1]) >= 0.99
+            tab.history_text.config(state="normal")
+            tab.history_text.insert(tk.END, item)
+            tab.history_text.config(state="disabled")
             if at_bot:
-                self.history_text.see(tk.END)
-        if self.gen_thread and self.gen_thread.is_alive():
-            self.history_text.after(50, self._process_queue)
+                tab.history_text.see(tk.END)
+        self._update_status(tab)
+        tab.history_text.after(50, self._process_queue, tab)
+
+    def _update_status(self, tab: ChatTab):
+        stats = self.scheduler.stats(tab.session)
+        text = (
+            f"{stats['tokens']} tokens · {stats['tokens_per_sec']:.1f} tok/s"
+            f" · waited {stats['wait']:.1f}s"
+        )
+        report = stats["report"]
+        if report:
+            text += f" · ended: {_END_REASONS.get(report['reason'], report['reason'])}"
+            if report.get("prompt_tokens"):
+                text += f" · prompt {report['prompt_tokens']} tokens"
+            if report.get("dropped_turns"):
+                text += f" ({report['dropped_turns']} oldest turns left out)"
+        tab.status.config(text=text)
 
     # ─────────────────── Post-processing ───────────────────
-    def _post_process(self, start: str, end: str):
-        raw = self.history_text.get(start, end)
+    def _post_process(self, tab: ChatTab, start: str, end: str):
+        raw = tab.history_text.get(start, end)
         clean = re.sub(r"\*\*(.*?)\*\*", r"\1", raw)
         clean = re.sub(r"\[([^\]]+)\]\(([^)]+)\)", r"\1: \2", clean)
         clean = self._table_pattern.sub(lambda m: self._md_table_to_tsv(m.group(1)), clean)
 
         if clean != raw:
-            self.history_text.delete(start, end)
-            self.history_text.insert(start, clean)
+            tab.history_text.delete(start, end)
+            tab.history_text.insert(start, clean)
 
-        self.history_text.tag_remove("user_word", start, end)
-        self._highlight_user_words(start, end)
-        self.assistant_segments.append((start, end))
+        tab.history_text.tag_remove("user_word", start, end)
+        self._highlight_user_words(tab, start, end)
+        tab.assistant_segments.append((start, end))
 
-    def _highlight_user_words(self, start: str, end: str):
+    def _highlight_user_words(self, tab: ChatTab, start: str, end: str):
         """
         Bold-underline every token appearing in ANY user prompt, including:
           • plain words   → hello
@@ -509,7 +790,7 @@ class ChatGUI:
         num_re = re.compile(r"\d+(?:\.\d+)?")
         dim_re = re.compile(r"\d+(?:x\d+)+", re.I)
 
-        for entry in self.history_data:
+        for entry in tab.history_data:
             txt = entry["user"]
             tokens.update(m.group(0) for m in word_re.finditer(txt))
             tokens.update(m.group(0) for m in num_re.finditer(txt))
@@ -530,22 +811,22 @@ class ChatGUI:
 
             idx = start
             while True:
-                idx = self.history_text.search(
+                idx = tab.history_text.search(
                     pattern, idx, end, nocase=True, regexp=use_regex
                 )
                 if not idx:
                     break
                 end_idx = f"{idx}+{len(tok)}c"
-                self.history_text.tag_add("user_word", idx, end_idx)
+                tab.history_text.tag_add("user_word", idx, end_idx)
                 idx = end_idx
 
     # ─── apply current style to the tag ─────────────────────────────
-    def _apply_word_style(self):
+    def _apply_word_style(self, tab: ChatTab):
         if self.style_on:
-            self.history_text.tag_config("user_word", font=self.bold_font, underline=True)
+            tab.history_text.tag_config("user_word", font=self.bold_font, underline=True)
         else:  # plain
-            self.history_text.tag_config(
-                "user_word", font=self.history_text.cget("font"), underline=False
+            tab.history_text.tag_config(
+                "user_word", font=tab.history_text.cget("font"), underline=False
             )
 
     def _center_window(self, win: tk.Toplevel):
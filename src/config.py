@@ -6,27 +6,64 @@ parent = Path(__file__).parent
 
 settings_path = Path("settings.json")
 
+def default_settings():
+    return {
+        "model": {
+            "path": "gemma-3-1b-it-Q4_K_M.gguf",
+            "prompt": "You helpful assistant"
+        },
+
+        "bindings": {
+            "send": "Shift-Return",
+            "find": "Control-f",
+            "edit-system-prompt": "Control-p",
+            "stop-generation": "Control-z",
+            "clear": "Control-x",
+            "new-tab": "Control-t",
+            "close-tab": "Control-w"
+        },
+
+        "generation": {
+            "max_tokens": 102400,
+            "reserve_tokens": 256,
+            "max_seconds": 600,
+            "loop_period": 64,
+            "loop_repeats": 4,
+            "idle_tokens": 32
+        },
+
+        "scheduler": {
+            "policy": "round-robin",
+            "quantum": 16
+        },
+
+        "memory": {
+            "enabled": False,
+            "model": "nomic-embed-text-v1.5.Q4_K_M.gguf",
+            "chats_dir": "chats",
+            "index_dir": "memory",
+            "dtype": "float16",
+            "top_k": 3,
+            "min_score": 0.5,
+            "batch_size": 32,
+            "document_prefix": "search_document: ",
+            "query_prefix": "search_query: "
+        }
+    }
+
 def load_settings():
+    data = default_settings()
     if settings_path.exists():
         with open(settings_path, mode='r', encoding="utf-8") as f:
-            data = json.load(f)
+            saved = json.load(f)
+        # keep defaults for keys missing from older settings files
+        for section, values in saved.items():
+            if isinstance(values, dict) and isinstance(data.get(section), dict):
+                data[section].update(values)
+            else:
+                data[section] = values
         if not Path(data['model']['path']).exists():
             data['model']['path'] = "gemma-3-1b-it-Q4_K_M.gguf"
-    else:
-        data = {
-            "model": {
-                "path": "gemma-3-1b-it-Q4_K_M.gguf",
-                "prompt": "You helpful assistant"
-            },
-
-            "bindings": {
-                "send": "Shift-Return",
-                "find": "Control-f",
-                "edit-system-prompt": "Control-p",
-                "stop-generation": "Control-z",
-                "clear": "Control-x"
-            }
-        }
     return data
 
 def save_settings(data, path, prompt):
@@ -1,17 +1,31 @@
 from __future__ import annotations
 
 import os
-from typing import List, Tuple
+import time
+from typing import TYPE_CHECKING, List, Tuple
 
 from llama_cpp import Llama
 from llama_cpp_agent import LlamaCppAgent
 from llama_cpp_agent.providers import LlamaCppPythonProvider
 from llama_cpp_agent.chat_history import BasicChatHistory
 from llama_cpp_agent.chat_history.messages import Roles
-from llama_cpp_agent.messages_formatter import MessagesFormatter, PromptMarkers
+from llama_cpp_agent.messages_formatter import (
+    MessagesFormatter,
+    MessagesFormatterType,
+    PromptMarkers,
+    get_predefined_messages_formatter,
+)
+
+from budget import EarlyStop, TokenCounter, fit_history
+from catalog import get_catalog, load_params, template_markers
+
+if TYPE_CHECKING:
+    from memory import MemoryIndex
 
 __all__ = [
     "respond",
+    "snapshot_model_state",
+    "restore_model_state",
 ]
 
 # ───────────────────────── Gemma‑3 prompt markers ──────────────────────────
@@ -31,9 +45,74 @@ _gemma_3_formatter = MessagesFormatter(
     eos_token="<eos>",
 )
 
+# Formatter keys produced by ``catalog.detect_chat_format``
+_formatters = {
+    "gemma-3": _gemma_3_formatter,
+    "chatml":  get_predefined_messages_formatter(MessagesFormatterType.CHATML),
+    "llama-3": get_predefined_messages_formatter(MessagesFormatterType.LLAMA_3),
+    "llama-2": get_predefined_messages_formatter(MessagesFormatterType.LLAMA_2),
+    "phi-3":   get_predefined_messages_formatter(MessagesFormatterType.PHI_3),
+    "mistral": get_predefined_messages_formatter(MessagesFormatterType.MISTRAL),
+}
+
+# ─────────────────────── Plain-text fallback markers ────────────────────────
+_plain_formatter = MessagesFormatter(
+    pre_prompt="",
+    prompt_markers={
+        Roles.system:    PromptMarkers("", "\n\n"),
+        Roles.user:      PromptMarkers("User: ", "\n"),
+        Roles.assistant: PromptMarkers("Assistant: ", "\n"),
+        Roles.tool:      PromptMarkers("", ""),
+    },
+    include_sys_prompt_in_first_user_message=False,
+    default_stop_sequences=["\nUser:"],
+    strip_prompt=False,
+)
+
+_template_formatters: dict[tuple, MessagesFormatter] = {}
+
+
+def _formatter_for(model_path: str, llm: Llama) -> MessagesFormatter:
+    """
+    Pick the chat formatter from the model's GGUF header: a known format,
+    else one derived from the model's own chat template, else plain
+    "User:"/"Assistant:" turns.
+    """
+    info = get_catalog().info(model_path)
+    if info["chat_format"] in _formatters:
+        return _formatters[info["chat_format"]]
+    template = info["chat_template"]
+    if not template:
+        return _plain_formatter
+
+    key = (model_path, template)
+    if key not in _template_formatters:
+        bos = llm.detokenize([llm.token_bos()], special=True).decode("utf-8", errors="ignore")
+        eos = llm.detokenize([llm.token_eos()], special=True).decode("utf-8", errors="ignore")
+        markers = template_markers(template, eos)
+        if markers is None:
+            _template_formatters[key] = _plain_formatter
+        else:
+            _template_formatters[key] = MessagesFormatter(
+                pre_prompt="",
+                prompt_markers={
+                    Roles.system:    PromptMarkers(*markers["system"]),
+                    Roles.user:      PromptMarkers(*markers["user"]),
+                    Roles.assistant: PromptMarkers(*markers["assistant"]),
+                    Roles.tool:      PromptMarkers("", ""),
+                },
+                include_sys_prompt_in_first_user_message=markers["system_in_user"],
+                default_stop_sequences=markers["stop"],
+                strip_prompt=False,
+                bos_token=bos,
+                eos_token=eos,
+            )
+    return _template_formatters[key]
+
 
 _llm: Llama | None = None
 _llm_model_path: str | None = None
+_token_counter = TokenCounter()
 
 
 def _lazy_load_model(model_path: str) -> Llama:
@@ -46,8 +125,7 @@ def _lazy_load_model(model_path: str) -> Llama:
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model not found: {model_path}")
 
-    _llm = Llama(
-        model_path=model_path,
+    params = dict(
         flash_attn=False,
         n_gpu_layers=0,
         n_batch=8,
@@ -55,10 +133,43 @@ def _lazy_load_model(model_path: str) -> Llama:
         n_threads=8,
         n_threads_batch=8,
     )
+    params.update(load_params(get_catalog().info(model_path)))
+    _llm = Llama(model_path=model_path, **params)
     _llm_model_path = model_path
     return _llm
 
 
+# ─────────────────────────── Session state swap ─────────────────────────────
+# ``Llama.generate`` keeps its sampler chain and mirostat mu on the instance,
+# so they travel together with the KV cache when sessions take turns.
+
+def snapshot_model_state():
+    """Capture the loaded model's KV cache and sampler, or ``None`` if no model."""
+    if _llm is None:
+        return None
+    return (
+        _llm_model_path,
+        _llm.save_state(),
+        getattr(_llm, "_sampler", None),
+        getattr(_llm, "_mirostat_mu", None),
+    )
+
+
+def restore_model_state(snapshot) -> bool:
+    """Re-install a snapshot taken from the currently loaded model."""
+    if snapshot is None or _llm is None or snapshot[0] != _llm_model_path:
+        return False
+    _, state, sampler, mirostat_mu = snapshot
+    try:
+        _llm.load_state(state)
+    except Exception:
+        _llm.reset()  # don't let generate() reuse a half-restored prefix
+        raise
+    _llm._sampler = sampler
+    _llm._mirostat_mu = mirostat_mu
+    return True
+
+
 # ───────────────────────────────── respond() ────────────────────────────────
 
 def respond(
@@ -72,19 +183,66 @@ def respond(
     top_p: float = 0.95,
     top_k: int = 40,
     repeat_penalty: float = 1.1,
+    memory: MemoryIndex | None = None,
+    memory_top_k: int = 3,
+    reserve_tokens: int = 256,
+    max_seconds: float | None = None,
+    loop_period: int = 64,
+    loop_repeats: int = 4,
+    idle_tokens: int = 32,
 ):
+    """
+    Stream the growing reply to *message*.
+
+    The prompt is measured with the model's tokenizer; the oldest turns are
+    dropped when fewer than *reserve_tokens* would be left for the reply, and
+    ``max_tokens`` is capped to the free context. Generation also ends early
+    on a time limit, a repetition loop or a run of whitespace tokens (see
+    ``budget.EarlyStop``). The generator's return value is a report dict
+    whose ``"reason"`` says why it ended.
+    """
 
     model_path = (
         model
         or "gemma-3-1b-it-Q4_K_M.gguf"  # default
     )
 
+    if memory is not None:
+        hits = memory.search(message, memory_top_k)
+        if hits:
+            notes = "\n---\n".join(text for _, text in hits)
+            system_message = (
+                f"{system_message}\n\n"
+                f"Relevant excerpts from earlier chats:\n{notes}"
+            )
+
     llm = _lazy_load_model(model_path)
+    formatter = _formatter_for(model_path, llm)
+
+    def count(role: str, text: str) -> int:
+        markers = formatter.prompt_markers[Roles(role)]
+        return _token_counter.count(llm, model_path, role, markers.start + text + markers.end)
+
+    n_ctx = llm.n_ctx()
+    history, prompt_tokens, dropped = fit_history(
+        count, system_message, history, message, n_ctx - reserve_tokens
+    )
+    report = {
+        "reason": "eos",
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": 0,
+        "dropped_turns": dropped,
+    }
+    if prompt_tokens >= n_ctx:
+        report["reason"] = "context_full"
+        yield f"[Stopped] The prompt needs {prompt_tokens} tokens but the context holds {n_ctx}.\n"
+        return report
+
     provider = LlamaCppPythonProvider(llm)
     agent = LlamaCppAgent(
         provider,
         system_prompt=system_message,
-        custom_messages_formatter=_gemma_3_formatter,
+        custom_messages_formatter=formatter,
         debug_output=False,
     )
 
@@ -92,7 +250,7 @@ def respond(
     settings.temperature = temperature
     settings.top_k = top_k
     settings.top_p = top_p
-    settings.max_tokens = max_tokens
+    settings.max_tokens = min(max_tokens, n_ctx - prompt_tokens)
     settings.repeat_penalty = repeat_penalty
     settings.stream = True
 
@@ -109,10 +267,26 @@ def respond(
         print_output=False,
     )
 
+    early_stop = EarlyStop(max_seconds, loop_period, loop_repeats, idle_tokens)
     full = ""
+    elapsed = 0.0  # own decoding time, excluding turns given to other sessions
+    resumed = time.perf_counter()
     try:
         for tok in stream:
             full += tok
+            report["completion_tokens"] += 1
+            elapsed += time.perf_counter() - resumed
+            reason = early_stop.feed(tok, elapsed)
             yield full
+            if reason:
+                report["reason"] = reason
+                stream.close()
+                break
+            resumed = time.perf_counter()
+        else:
+            if report["completion_tokens"] >= settings.max_tokens:
+                report["reason"] = "max_tokens"
     except Exception as exc:
-        yield f"[Error] {exc}\n"
+        report["reason"] = "error"
+        yield f"{full}[Error] {exc}\n"
+    return report
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+from llama_cpp import Llama
+
+__all__ = [
+    "MemoryIndex",
+    "chunk_history",
+]
+
+_BLOCK_ROWS = 16_384  # rows decoded per step from the on-disk matrix
+_DTYPES = {"float16": np.float16, "int8": np.int8}
+
+
+def chunk_history(history: List[dict], max_chars: int = 1200, overlap: int = 200) -> List[str]:
+    """Split saved chat turns into overlapping text chunks."""
+    chunks: List[str] = []
+    step = max(max_chars - overlap, 1)
+    for entry in history:
+        text = f"User: {entry['user']}\nAssistant: {entry['assistant']}".strip()
+        for start in range(0, max(len(text) - overlap, 1), step):
+            chunks.append(text[start:start + max_chars])
+    return chunks
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class MemoryIndex:
+    """
+    Embedding index over saved chats.
+
+    Layout of *index_dir*::
+
+        manifest.json   dim, dtype, row count and indexed chat files
+        vectors.bin     (count, dim) row-major matrix, memory-mapped
+        chunks.jsonl    one {"text": ...} line per row
+
+    Rows are unit vectors stored as float16, or as int8 scaled by 127.
+    Only chunks that are not in the index yet get embedded. For search the
+    memmap is decoded once into a float32 matrix, extended as rows are
+    appended, so a query is one BLAS matrix-vector product plus a top-k.
+    That copy costs 4 bytes per dimension per row whatever the on-disk
+    dtype (about 300 MB for 100k rows of 768), and the product is bound by
+    memory bandwidth: roughly 30 ms per query at that size on one core.
+
+    *document_prefix* and *query_prefix* are prepended to chunks and
+    queries before embedding, for models trained with task prefixes (nomic:
+    ``"search_document: "`` / ``"search_query: "``). They are stored in the
+    manifest, which wins over the arguments, like *dtype*.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        index_dir: str = "memory",
+        dtype: str = "float16",
+        batch_size: int = 32,
+        min_score: float = 0.0,
+        document_prefix: str = "",
+        query_prefix: str = "",
+    ):
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported memory dtype: {dtype}")
+        self.model_path = model_path
+        self.dir = Path(index_dir)
+        self.dtype = dtype
+        self.batch_size = max(int(batch_size), 1)
+        self.min_score = min_score
+        self.document_prefix = document_prefix
+        self.query_prefix = query_prefix
+
+        self._llm: Llama | None = None
+        self._embed_lock = threading.Lock()  # guards the embedding model
+        self._lock = threading.Lock()        # guards the matrix and chunk list
+
+        self.dim = 0
+        self.count = 0
+        self.files: dict[str, list] = {}
+        self.texts: List[str] = []
+        self._hashes: set[str] = set()
+        self._vectors: np.memmap | None = None
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._decoded = 0
+        self._load()
+
+    # ─────────────────── Storage ───────────────────
+    @property
+    def _manifest_path(self) -> Path:
+        return self.dir / "manifest.json"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.dir / "vectors.bin"
+
+    @property
+    def _chunks_path(self) -> Path:
+        return self.dir / "chunks.jsonl"
+
+    def _load(self):
+        if not self._manifest_path.exists():
+            return
+        with open(self._manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.dim = manifest["dim"]
+        self.count = manifest["count"]
+        self.dtype = manifest["dtype"]
+        self.files = manifest["files"]
+        # indexes written before prefixes were supported embedded bare text
+        self.document_prefix = manifest.get("document_prefix", "")
+        self.query_prefix = manifest.get("query_prefix", "")
+
+        # Drop rows written after the last manifest update (interrupted indexing).
+        # Both files are appended before the manifest, so either may be longer;
+        # an index that never got a row has no data files at all.
+        row_bytes = self.dim * np.dtype(_DTYPES[self.dtype]).itemsize
+        if self._vectors_path.exists():
+            if os.path.getsize(self._vectors_path) != self.count * row_bytes:
+                os.truncate(self._vectors_path, self.count * row_bytes)
+        elif self.count:
+            raise ValueError("Memory index is damaged: vectors.bin is missing.")
+
+        texts = []
+        if self._chunks_path.exists():
+            with open(self._chunks_path, "r", encoding="utf-8") as f:
+                texts = [json.loads(line)["text"] for line in f]
+        if len(texts) < self.count:
+            raise ValueError("Memory index is damaged: chunks.jsonl is missing rows.")
+        self.texts = texts[: self.count]
+        self._hashes = {_digest(t) for t in self.texts}
+        if len(texts) > self.count:
+            with open(self._chunks_path, "w", encoding="utf-8") as f:
+                for text in self.texts:
+                    f.write(json.dumps({"text": text}, ensure_ascii=False) + "\n")
+        self._map()
+
+    def _map(self):
+        if self.count:
+            self._vectors = np.memmap(
+                self._vectors_path,
+                dtype=_DTYPES[self.dtype],
+                mode="r",
+                shape=(self.count, self.dim),
+            )
+        else:
+            self._vectors = None
+
+    def _save_manifest(self):
+        tmp = self._manifest_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "dim": self.dim,
+                    "count": self.count,
+                    "dtype": self.dtype,
+                    "document_prefix": self.document_prefix,
+                    "query_prefix": self.query_prefix,
+                    "files": self.files,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        os.replace(tmp, self._manifest_path)
+
+    def _append(self, texts: List[str], vectors: np.ndarray):
+        if self.dtype == "int8":
+            rows = np.clip(np.rint(vectors * 127.0), -127, 127).astype(np.int8)
+        else:
+            rows = vectors.astype(np.float16)
+        with self._lock:
+            if not self.dim:
+                self.dim = rows.shape[1]
+            with open(self._vectors_path, "ab") as f:
+                f.write(rows.tobytes())
+            with open(self._chunks_path, "a", encoding="utf-8") as f:
+                for text in texts:
+                    f.write(json.dumps({"text": text}, ensure_ascii=False) + "\n")
+            self.texts.extend(texts)
+            self._hashes.update(_digest(t) for t in texts)
+            self.count += len(texts)
+            self._map()
+            self._save_manifest()
+
+    # ─────────────────── Embedding ───────────────────
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        with self._embed_lock:
+            if self._llm is None:
+                if not os.path.exists(self.model_path):
+                    raise FileNotFoundError(f"Embedding model not found: {self.model_path}")
+                self._llm = Llama(
+                    model_path=self.model_path,
+                    embedding=True,
+                    n_gpu_layers=0,
+                    n_ctx=2048,
+                    n_batch=2048,
+                    n_threads=8,
+                    verbose=False,
+                )
+            vectors = np.asarray(self._llm.embed(texts, normalize=False), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    # ─────────────────── Public API ───────────────────
+    def update(self, chats_dir: str) -> int:
+        """Embed chunks of new or changed chat files in *chats_dir*; returns rows added."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        pending: List[str] = []
+        seen: set[str] = set()
+        signatures: dict[str, list] = {}
+
+        for path in sorted(Path(chats_dir).glob("*.json")):
+            st = path.stat()
+            key = str(path.resolve())
+            sig = [st.st_size, st.st_mtime_ns]
+            if self.files.get(key) == sig:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    history = json.load(f)
+                chunks = chunk_history(history)
+            except (ValueError, KeyError, TypeError):
+                continue  # not a chat export
+            for text in chunks:
+                digest = _digest(text)
+                if digest not in self._hashes and digest not in seen:
+                    seen.add(digest)
+                    pending.append(text)
+            signatures[key] = sig
+
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            self._append(batch, self._embed([self.document_prefix + t for t in batch]))
+
+        with self._lock:
+            self.files.update(signatures)
+            self._save_manifest()
+        return len(pending)
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[float, str]]:
+        """Return up to *k* ``(score, chunk)`` pairs ranked by cosine similarity."""
+        if not self.count or k <= 0:
+            return []
+        q = self._embed([self.query_prefix + query])[0]
+        with self._lock:
+            if q.shape[0] != self.dim:
+                raise ValueError("Embedding model does not match the memory index.")
+            scores = self._scores(q)
+            k = min(k, self.count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                (float(scores[i]), self.texts[i])
+                for i in top
+                if scores[i] >= self.min_score
+            ]
+
+    def _scores(self, q: np.ndarray) -> np.ndarray:
+        self._decode_new_rows()
+        return self._matrix[: self.count] @ q
+
+    def _decode_new_rows(self):
+        """Copy rows appended since the last search into the float32 matrix."""
+        if self._decoded == self.count:
+            return
+        if len(self._matrix) < self.count or self._matrix.shape[1] != self.dim:
+            grown = np.empty((max(self.count, 2 * len(self._matrix)), self.dim), dtype=np.float32)
+            if self._decoded:
+                grown[: self._decoded] = self._matrix[: self._decoded]
+            self._matrix = grown
+        for start in range(self._decoded, self.count, _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, self.count)
+            rows = self._matrix[start:stop]
+            rows[...] = self._vectors[start:stop]
+            if self.dtype == "int8":
+                rows *= 1.0 / 127.0
+        self._decoded = self.count
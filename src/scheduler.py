@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import List, Tuple
+
+from llm_utils import respond, restore_model_state, snapshot_model_state
+
+__all__ = ["GenerationScheduler", "Session", "POLICIES"]
+
+POLICIES = ("round-robin", "priority")
+
+
+class _Job:
+    """One queued prompt; deltas go to *out*, followed by ``None`` when done."""
+
+    def __init__(
+        self,
+        prompt: str,
+        history: List[Tuple[str, str]],
+        model: str,
+        system_message: str,
+        options: dict,
+        out: queue.Queue,
+    ):
+        self.prompt = prompt
+        self.history = history
+        self.model = model
+        self.system_message = system_message
+        self.options = options
+        self.out = out
+        self.stream = None
+        self.text = ""
+        self.tokens = 0
+        self.submitted = time.perf_counter()
+        self.finished: float | None = None
+        self.run_time = 0.0
+        self.cancel = threading.Event()
+        self.report: dict | None = None  # respond()'s return value
+        self.error: str | None = None    # set when the job can't be resumed
+
+    @property
+    def wait(self) -> float:
+        """Seconds spent queued behind other sessions (not decoding)."""
+        end = self.finished or time.perf_counter()
+        return max(end - self.submitted - self.run_time, 0.0)
+
+
+class Session:
+    """A chat tab as seen by the scheduler: its job queue and saved model state."""
+
+    def __init__(self, name: str, priority: int = 0):
+        self.name = name
+        self.priority = priority
+        self.jobs: deque[_Job] = deque()
+        self.state = None
+        self.closed = False
+        self.last_job: _Job | None = None
+
+
+class GenerationScheduler:
+    """
+    Share one loaded model between several chat sessions.
+
+    A single worker thread decodes ``quantum`` tokens for one session, then
+    moves on to the next session with queued work. When the session changes,
+    the KV cache of the previous one is snapshotted and the next one's is
+    restored, so every tab keeps its own context and prefix cache.
+    """
+
+    def __init__(self, policy: str = "round-robin", quantum: int = 16):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.policy = policy
+        self.quantum = max(int(quantum), 1)
+        self._sessions: list[Session] = []
+        self._cursor = -1
+        self._resident: Session | None = None
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ─────────────────── Sessions ───────────────────
+    def open_session(self, name: str, priority: int = 0) -> Session:
+        session = Session(name, priority)
+        with self._cond:
+            self._sessions.append(session)
+        return session
+
+    def close_session(self, session: Session):
+        with self._cond:
+            session.closed = True
+            for job in session.jobs:
+                job.cancel.set()
+            if session in self._sessions:
+                idx = self._sessions.index(session)
+                self._sessions.remove(session)
+                if idx <= self._cursor:
+                    self._cursor -= 1
+            session.state = None
+            self._cond.notify()
+
+    def submit(
+        self,
+        session: Session,
+        prompt: str,
+        history: List[Tuple[str, str]],
+        *,
+        model: str,
+        system_message: str,
+        **options,
+    ) -> queue.Queue:
+        """
+        Queue *prompt* for *session*; returns the queue its deltas arrive on.
+        Extra keyword *options* are passed through to ``respond()``.
+        """
+        out: queue.Queue[str | None] = queue.Queue()
+        job = _Job(prompt, history, model, system_message, options, out)
+        with self._cond:
+            session.jobs.append(job)
+            self._cond.notify()
+        return out
+
+    def stop(self, session: Session):
+        """Cancel the running and queued jobs of *session*."""
+        with self._cond:
+            for job in session.jobs:
+                job.cancel.set()
+
+    def is_busy(self, session: Session | None = None) -> bool:
+        with self._cond:
+            if session is not None:
+                return bool(session.jobs)
+            return any(s.jobs for s in self._sessions)
+
+    def stats(self, session: Session) -> dict:
+        """Throughput and wait time of the running (or last finished) job."""
+        with self._cond:
+            job = session.jobs[0] if session.jobs else session.last_job
+            pending = len(session.jobs)
+        if job is None:
+            return {"tokens": 0, "tokens_per_sec": 0.0, "wait": 0.0, "pending": 0, "report": None}
+        return {
+            "tokens": job.tokens,
+            "tokens_per_sec": job.tokens / job.run_time if job.run_time else 0.0,
+            "wait": job.wait,
+            "pending": pending,
+            "report": job.report if job.finished else None,
+        }
+
+    def forget_states(self):
+        """Drop saved KV caches (e.g. after the model was changed)."""
+        with self._cond:
+            for s in self._sessions:
+                s.state = None
+            self._resident = None
+
+    def shutdown(self):
+        with self._cond:
+            self._shutdown = True
+            for s in self._sessions:
+                for job in s.jobs:
+                    job.cancel.set()
+            self._cond.notify()
+
+    # ─────────────────── Worker ───────────────────
+    def _pick(self) -> Session:
+        """Next ready session after the cursor; highest priority first if asked."""
+        n = len(self._sessions)
+        order = [self._sessions[(self._cursor + 1 + i) % n] for i in range(n)]
+        ready = [s for s in order if s.jobs]
+        if self.policy == "priority":
+            session = max(ready, key=lambda s: s.priority)
+        else:
+            session = ready[0]
+        self._cursor = self._sessions.index(session)
+        return session
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._shutdown and not any(s.jobs for s in self._sessions):
+                    self._cond.wait()
+                if self._shutdown:
+                    return
+                session = self._pick()
+                job = session.jobs[0]
+
+            self._swap_to(session, job)
+            if not self._run_slice(session, job):
+                continue
+
+            job.finished = time.perf_counter()
+            with self._cond:
+                if session.jobs and session.jobs[0] is job:
+                    session.jobs.popleft()
+                session.last_job = job
+            job.out.put(None)
+
+    def _swap_to(self, session: Session, job: _Job):
+        """Make *session*'s KV cache resident; marks *job* failed if it can't resume."""
+        if self._resident is session:
+            return
+        outgoing, self._resident = self._resident, session
+        if outgoing is not None and not outgoing.closed:
+            try:
+                outgoing.state = snapshot_model_state()
+            except Exception as e:
+                # Queued jobs just lose the prefix cache, a started one its context.
+                outgoing.state = None
+                with self._cond:
+                    running = outgoing.jobs[0] if outgoing.jobs else None
+                if running is not None and running.stream is not None:
+                    running.error = f"Could not save the session state: {e}"
+
+        try:
+            restored = restore_model_state(session.state)
+            reason = "its saved state was lost"
+        except Exception as e:
+            session.state = None
+            restored, reason = False, str(e)
+        if not restored and job.stream is not None and job.error is None:
+            job.error = f"Could not resume generation: {reason}"
+
+    def _run_slice(self, session: Session, job: _Job) -> bool:
+        """Decode up to ``quantum`` tokens of *job*; ``True`` once it has ended."""
+        start = time.perf_counter()
+        try:
+            if job.error:
+                if job.stream is not None:
+                    job.stream.close()
+                job.out.put(f"[Error] {job.error}\n")
+                job.report = {"reason": "error"}
+                return True
+            if job.stream is None:
+                if job.cancel.is_set():
+                    job.report = {"reason": "cancelled"}
+                    return True
+                job.stream = respond(
+                    job.prompt,
+                    job.history,
+                    model=job.model,
+                    system_message=job.system_message,
+                    **job.options,
+                )
+            for _ in range(self.quantum):
+                if job.cancel.is_set() or session.closed:
+                    job.stream.close()
+                    job.report = {"reason": "cancelled"}
+                    return True
+                try:
+                    full = next(job.stream)
+                except StopIteration as done:
+                    job.report = done.value
+                    return True
+                job.out.put(full[len(job.text) :])
+                job.text = full
+                job.tokens += 1
+            return False
+        except Exception as e:
+            job.out.put(f"[Error] {e}\n")
+            job.report = {"reason": "error"}
+            return True
+        finally:
+            job.run_time += time.perf_counter() - start
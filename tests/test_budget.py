@@ -0,0 +1,61 @@
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from budget import EarlyStop  # noqa: E402
+
+
+def _run(tokens, **kwargs):
+    stop = EarlyStop(**kwargs)
+    for i, tok in enumerate(tokens):
+        reason = stop.feed(tok, 0.0)
+        if reason:
+            return reason, i
+    return None, len(tokens)
+
+
+def _prose(n, seed=1):
+    rng = random.Random(seed)
+    words = "the a of cat dog sat on mat and then ran".split()
+    return [rng.choice(words) + " " for _ in range(n)]
+
+
+def test_prose_is_not_a_loop():
+    assert _run(_prose(500)) == (None, 500)
+
+
+def test_zero_array_is_not_a_loop():
+    assert _run(["["] + ["0", ","] * 20 + ["0", "]"] + _prose(50))[0] is None
+
+
+def test_markdown_separator_is_not_a_loop():
+    assert _run(["|", "---"] * 20 + ["|", "\n"] + _prose(50))[0] is None
+
+
+def test_long_rule_is_not_a_loop():
+    assert _run(["="] * 80 + ["\n"] + _prose(50))[0] is None
+
+
+def test_small_zero_matrix_is_not_a_loop():
+    row = ["[", "0", ",", " 0", ",", " 0", ",", " 0", "],", "\n"]
+    assert _run(_prose(50) + row * 4 + _prose(50))[0] is None
+
+
+def test_repeated_sentence_is_a_loop():
+    tokens = _prose(50) + ["I", " am", " a", " helpful", " bot", ",", " really", "."] * 40
+    reason, index = _run(tokens)
+    assert reason == "loop"
+    assert index < 50 + 256 + 8
+
+
+def test_degenerate_short_repeat_is_eventually_a_loop():
+    assert _run(_prose(20) + ["0", ","] * 200)[0] == "loop"
+
+
+def test_idle_and_time_limit():
+    assert _run(_prose(10) + ["\n"] * 40)[0] == "idle"
+    stop = EarlyStop(max_seconds=5)
+    assert stop.feed("x", 1.0) is None
+    assert stop.feed("y", 6.0) == "time_limit"
@@ -0,0 +1,133 @@
+import os
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import catalog  # noqa: E402
+from catalog import ModelCatalog, detect_chat_format, read_gguf_metadata, template_markers  # noqa: E402
+
+
+def _str(s):
+    data = s.encode("utf-8")
+    return struct.pack("<Q", len(data)) + data
+
+
+def _kv(key, vtype, payload):
+    return _str(key) + struct.pack("<I", vtype) + payload
+
+
+def _gguf(path, arch="llama", template=None, name="Test Model", ctx=4096):
+    """Write a header-only GGUF v3 file with a vocabulary array to skip."""
+    kvs = [
+        _kv("general.architecture", 8, _str(arch)),
+        _kv("general.name", 8, _str(name)),
+        _kv("general.file_type", 4, struct.pack("<I", 15)),
+        # string array, then a nested array of u32 arrays, both skipped
+        _kv("tokenizer.ggml.tokens", 9, struct.pack("<IQ", 8, 3) + _str("<s>") + _str("a") + _str("b")),
+        _kv("test.nested", 9, struct.pack("<IQ", 9, 2) + struct.pack("<IQII", 4, 2, 1, 2) * 2),
+        _kv(f"{arch}.context_length", 4, struct.pack("<I", ctx)),
+        _kv("tokenizer.ggml.scores", 9, struct.pack("<IQ", 6, 3) + struct.pack("<fff", 0, 1, 2)),
+    ]
+    if template is not None:
+        kvs.append(_kv("tokenizer.chat_template", 8, _str(template)))
+    header = b"GGUF" + struct.pack("<IQQ", 3, 0, len(kvs))
+    Path(path).write_bytes(header + b"".join(kvs))
+
+
+_CHATML = (
+    "{% for m in messages %}<|im_start|>{{ m['role'] }}\n{{ m['content'] }}<|im_end|>\n{% endfor %}"
+    "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+
+
+def test_read_metadata_skips_strings_and_arrays(tmp_path):
+    path = tmp_path / "m.gguf"
+    _gguf(path, arch="qwen2", template=_CHATML)
+    meta = read_gguf_metadata(str(path))
+    assert meta == {
+        "general.architecture": "qwen2",
+        "general.name": "Test Model",
+        "general.file_type": 15,
+        "qwen2.context_length": 4096,
+        "tokenizer.chat_template": _CHATML,
+    }
+
+
+def test_read_metadata_rejects_other_files(tmp_path):
+    path = tmp_path / "m.gguf"
+    path.write_bytes(b"GGML" + bytes(20))
+    with pytest.raises(ValueError):
+        read_gguf_metadata(str(path))
+
+
+def test_detect_chat_format():
+    assert detect_chat_format("qwen2", _CHATML) == "chatml"
+    assert detect_chat_format("gemma3", None) == "gemma-3"
+    assert detect_chat_format("llama", None, "Meta Llama 3.1 8B") == "llama-3"
+    assert detect_chat_format("llama", None, tokenizer_pre="llama-bpe") == "llama-3"
+    assert detect_chat_format("llama", None, "TinyLlama") == "llama-2"
+    assert detect_chat_format("llama", "{{ messages }}", "Vicuna") is None
+    assert detect_chat_format("starcoder2", None) is None
+
+
+def test_template_markers():
+    markers = template_markers(_CHATML, "</s>")
+    if markers is None:
+        pytest.skip("jinja2 is not installed")
+    assert markers["user"] == ("<|im_start|>user\n", "<|im_end|>\n")
+    assert markers["assistant"] == ("<|im_start|>assistant\n", "<|im_end|>\n")
+    assert markers["system"] == ("<|im_start|>system\n", "<|im_end|>\n")
+    assert not markers["system_in_user"]
+    assert "<|im_end|>" in markers["stop"]
+    assert template_markers("{% for m in messages %}", "") is None
+
+
+def test_catalog_reuses_cache_until_file_changes(tmp_path, monkeypatch):
+    models = tmp_path / "models"
+    models.mkdir()
+    path = models / "m.gguf"
+    _gguf(path, template=_CHATML)
+    cache = tmp_path / "catalog.json"
+
+    parsed = []
+    real_read = catalog.read_gguf_metadata
+
+    def counting_read(p):
+        parsed.append(p)
+        return real_read(p)
+
+    monkeypatch.setattr(catalog, "read_gguf_metadata", counting_read)
+
+    entry = ModelCatalog(str(models), str(cache)).info(str(path))
+    assert entry["chat_format"] == "chatml"
+    assert (entry["quantization"], entry["context_length"]) == ("Q4_K_M", 4096)
+    assert ModelCatalog(str(models), str(cache)).scan()[0]["chat_format"] == "chatml"
+    assert len(parsed) == 1  # served from the cache file
+
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    ModelCatalog(str(models), str(cache)).info(str(path))
+    assert len(parsed) == 2  # mtime changed
+
+    _gguf(path, arch="gemma3", name="A longer name")
+    assert ModelCatalog(str(models), str(cache)).info(str(path))["chat_format"] == "gemma-3"
+    assert len(parsed) == 3  # size changed
+
+    monkeypatch.setattr(catalog, "_ENTRY_VERSION", catalog._ENTRY_VERSION + 1)
+    ModelCatalog(str(models), str(cache)).info(str(path))
+    assert len(parsed) == 4  # entry version changed
+
+
+def test_scan_without_parsing_marks_new_files_pending(tmp_path):
+    models = tmp_path / "models"
+    models.mkdir()
+    _gguf(models / "m.gguf")
+    cat = ModelCatalog(str(models), str(tmp_path / "catalog.json"))
+    (entry,) = cat.scan(parse=False)
+    assert entry["pending"] and entry["architecture"] is None
+    assert cat.info(entry["path"])["architecture"] == "llama"
+    assert "pending" not in cat.scan(parse=False)[0]
@@ -0,0 +1,127 @@
+import json
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# memory.py only needs llama_cpp.Llama, which the tests replace with a stub
+sys.modules.setdefault("llama_cpp", types.SimpleNamespace(Llama=None))
+
+import memory  # noqa: E402
+from memory import MemoryIndex  # noqa: E402
+
+
+class _StubLlama:
+    """Bag-of-words embedder: one dimension per known word."""
+
+    WORDS = "cat dog fish bird tree car".split()
+
+    def __init__(self, **kwargs):
+        pass
+
+    def embed(self, texts, normalize=False):
+        return [
+            [text.lower().count(w) + 0.01 for w in self.WORDS]
+            for text in texts
+        ]
+
+
+@pytest.fixture
+def index_args(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, "Llama", _StubLlama)
+    model = tmp_path / "embed.gguf"
+    model.write_bytes(b"")
+    return {"model_path": str(model), "index_dir": str(tmp_path / "memory")}
+
+
+def _save_chat(path, *turns):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps([{"user": u, "assistant": a} for u, a in turns]), encoding="utf-8"
+    )
+
+
+def test_empty_update_reloads(tmp_path, index_args):
+    (tmp_path / "chats").mkdir()
+    assert MemoryIndex(**index_args).update(str(tmp_path / "chats")) == 0
+    index = MemoryIndex(**index_args)
+    assert index.count == 0
+    assert index.search("cat") == []
+
+
+def test_prefixes_are_applied_and_kept(tmp_path, index_args, monkeypatch):
+    seen = []
+
+    class Recording(_StubLlama):
+        def embed(self, texts, normalize=False):
+            seen.extend(texts)
+            return super().embed(texts, normalize)
+
+    monkeypatch.setattr(memory, "Llama", Recording)
+    _save_chat(tmp_path / "chats" / "a.json", ("my cat", "nice cat"))
+    index = MemoryIndex(**index_args, document_prefix="doc: ", query_prefix="query: ")
+    index.update(str(tmp_path / "chats"))
+    index.search("cat")
+    assert seen == ["doc: User: my cat\nAssistant: nice cat", "query: cat"]
+
+    reopened = MemoryIndex(**index_args)  # the manifest wins over the arguments
+    assert (reopened.document_prefix, reopened.query_prefix) == ("doc: ", "query: ")
+
+
+def test_update_is_incremental(tmp_path, index_args):
+    chats = tmp_path / "chats"
+    _save_chat(chats / "a.json", ("my cat", "nice cat"))
+    index = MemoryIndex(**index_args)
+    assert index.update(str(chats)) == 1
+    assert index.update(str(chats)) == 0  # unchanged file is skipped
+
+    _save_chat(chats / "b.json", ("my cat", "nice cat"), ("a dog", "good dog"))
+    assert index.update(str(chats)) == 1  # only the new turn is embedded
+    assert MemoryIndex(**index_args).count == 2
+
+
+def test_search_ranks_by_similarity(tmp_path, index_args):
+    chats = tmp_path / "chats"
+    _save_chat(chats / "a.json", ("cat cat", "cat"), ("dog", "dog dog"), ("a fish", "in a tree"))
+    index = MemoryIndex(**index_args, min_score=0.5)
+    index.update(str(chats))
+    hits = index.search("dog", k=2)
+    assert len(hits) == 1 and "dog" in hits[0][1]
+    assert hits[0][0] == pytest.approx(1.0, abs=0.01)
+    assert [t for _, t in MemoryIndex(**index_args).search("cat fish", k=3)][0].startswith("User: cat")
+
+
+def test_int8_round_trip(tmp_path, index_args):
+    chats = tmp_path / "chats"
+    _save_chat(chats / "a.json", ("cat", "dog"), ("fish", "bird"))
+    MemoryIndex(**index_args, dtype="int8").update(str(chats))
+    index = MemoryIndex(**index_args)  # dtype comes from the manifest
+    assert index.dtype == "int8"
+    assert (tmp_path / "memory" / "vectors.bin").stat().st_size == 2 * len(_StubLlama.WORDS)
+    score, text = index.search("fish bird", k=1)[0]
+    assert "fish" in text and score == pytest.approx(1.0, abs=0.02)
+
+
+def test_load_drops_rows_written_after_the_manifest(tmp_path, index_args):
+    chats = tmp_path / "chats"
+    _save_chat(chats / "a.json", ("cat", "dog"))
+    index = MemoryIndex(**index_args)
+    index.update(str(chats))
+    vectors = tmp_path / "memory" / "vectors.bin"
+    size = vectors.stat().st_size
+
+    # an interrupted update: rows appended, manifest never rewritten
+    with open(vectors, "ab") as f:
+        f.write(b"\0" * size)
+    with open(tmp_path / "memory" / "chunks.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps({"text": "stray"}) + "\n")
+
+    index = MemoryIndex(**index_args)
+    assert index.count == 1 and index.texts == ["User: cat\nAssistant: dog"]
+    assert vectors.stat().st_size == size
+    _save_chat(chats / "b.json", ("fish", "bird"))
+    index.update(str(chats))
+    assert "fish" in index.search("fish", k=1)[0][1]
@@ -0,0 +1,115 @@
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# scheduler.py only needs these three from llm_utils (which loads llama_cpp)
+sys.modules.setdefault(
+    "llm_utils",
+    types.SimpleNamespace(
+        respond=None,
+        snapshot_model_state=lambda: None,
+        restore_model_state=lambda state: False,
+    ),
+)
+
+import scheduler  # noqa: E402
+from scheduler import GenerationScheduler  # noqa: E402
+
+
+@pytest.fixture
+def decoded(monkeypatch):
+    """Stub respond(): yields ``tokens`` copies of the prompt, logging each one."""
+    log = []
+
+    def respond(prompt, history, *, model, system_message, tokens=4):
+        text = ""
+        for _ in range(tokens):
+            log.append(prompt)
+            text += prompt
+            yield text
+        return {"reason": "eos"}
+
+    monkeypatch.setattr(scheduler, "respond", respond)
+    monkeypatch.setattr(scheduler, "snapshot_model_state", lambda: "kv")
+    monkeypatch.setattr(scheduler, "restore_model_state", lambda state: state is not None)
+    return log
+
+
+def _drain(out):
+    text = ""
+    while (delta := out.get(timeout=5)) is not None:
+        text += delta
+    return text
+
+
+def _submit_all(sch, sessions, **options):
+    # holding the lock keeps the worker from starting before every job is queued
+    with sch._cond:
+        return [
+            sch.submit(s, s.name, [], model="m", system_message="", **options)
+            for s in sessions
+        ]
+
+
+def test_round_robin_takes_turns(decoded):
+    sch = GenerationScheduler("round-robin", quantum=2)
+    sessions = [sch.open_session(name) for name in "abc"]
+    outs = _submit_all(sch, sessions)
+    assert [_drain(out) for out in outs] == ["aaaa", "bbbb", "cccc"]
+    assert "".join(decoded) == "aabbccaabbcc"
+    sch.shutdown()
+
+
+def test_priority_runs_highest_first(decoded):
+    sch = GenerationScheduler("priority", quantum=1)
+    sessions = [sch.open_session("a", 0), sch.open_session("b", 2), sch.open_session("c", 1)]
+    for out in _submit_all(sch, sessions, tokens=3):
+        _drain(out)
+    assert "".join(decoded) == "bbbcccaaa"
+    sch.shutdown()
+
+
+def test_stop_cancels_only_that_session(decoded):
+    sch = GenerationScheduler("round-robin", quantum=1)
+    a, b = sch.open_session("a"), sch.open_session("b")
+    with sch._cond:
+        out_a = sch.submit(a, "a", [], model="m", system_message="", tokens=10**9)
+        out_b = sch.submit(b, "b", [], model="m", system_message="", tokens=1000)
+    assert out_a.get(timeout=5) == "a"
+    sch.stop(a)
+    _drain(out_a)
+    assert sch.stats(a)["report"] == {"reason": "cancelled"}
+    assert _drain(out_b) == "b" * 1000
+    assert sch.stats(b)["report"] == {"reason": "eos"}
+    sch.shutdown()
+
+
+def test_close_session_keeps_the_cursor_on_the_next_session(decoded):
+    sch = GenerationScheduler("round-robin")
+    a, b, c = (sch.open_session(name) for name in "abc")
+    with sch._cond:
+        _submit_all(sch, [a, b, c])
+        assert sch._pick() is a
+        assert sch._pick() is b
+        sch.close_session(a)  # before the cursor: c is still next
+        assert sch._pick() is c
+        sch.shutdown()
+
+
+def test_failed_restore_ends_a_started_job(decoded, monkeypatch):
+    def restore(state):
+        if state is not None:
+            raise RuntimeError("no memory")
+        return False
+
+    monkeypatch.setattr(scheduler, "restore_model_state", restore)
+    sch = GenerationScheduler("round-robin", quantum=2)
+    a, b = sch.open_session("a"), sch.open_session("b")
+    out_a, out_b = _submit_all(sch, [a, b])
+    assert _drain(out_a) == "aa[Error] Could not resume generation: no memory\n"
+    assert sch.stats(a)["report"] == {"reason": "error"}
+    sch.shutdown()